@@ -0,0 +1,66 @@
+""" Directivity (polar) measurements and their storage """
+import math
+import numpy as np
+import smoothing
+
+class Turntable(object):
+    """ Controller for the turntable the loudspeaker is mounted on.
+
+    This is only a stub which remembers the requested angle; subclass it and
+    override `rotate_to` to drive real hardware or to ask the user to turn
+    the speaker by hand. """
+
+    def __init__(self):
+        self._angle = 0.0
+
+    @property
+    def angle(self):
+        """ Current angle in degrees """
+        return self._angle
+
+    def rotate_to(self, angle):
+        """ Rotate to `angle` degrees. Returns False if it was cancelled. """
+        self._angle = angle
+        return True
+
+def polar_angles(start=-90.0, stop=90.0, step=10.0):
+    """ Angles in degrees from `start` towards `stop` (inclusive), `step`
+    degrees apart. `stop` may be smaller than `start`. """
+    step = math.copysign(step, stop - start)
+    # Tolerance, so that `stop` is included despite rounding errors
+    number_of_angles = int(math.floor((stop - start) / step + 1e-9)) + 1
+    return start + step * np.arange(number_of_angles)
+
+class PolarResponse(object):
+    """ Amplitude responses of a directivity measurement, stored as one
+    (angle x frequency) array over the logarithmic frequencies of
+    `smoothing`. """
+
+    def __init__(self, angles):
+        self.angles = np.asarray(angles, dtype=float)
+        self.amplitude = np.zeros((len(self.angles),
+                                   smoothing.NUMBER_OF_POINTS),
+                                  dtype=np.float32)
+        self.number_of_measured = 0
+
+    def add(self, amplitude, frequency_max):
+        """ Store the one-sided amplitude spectrum, running from 0 Hz to
+        `frequency_max`, measured at the next angle """
+        self.amplitude[self.number_of_measured] = \
+            smoothing.distribute_over_log(amplitude, frequency_max)
+        self.number_of_measured += 1
+
+    def representation(self, nth_octave=6, window_type='hamming'):
+        """ Smoothed responses in dB, relative to the response at the
+        measured angle closest to on-axis (0 degrees).
+
+        Returns the measured angles, an (angle x frequency) array and the
+        reference angle. """
+        angles = self.angles[:self.number_of_measured]
+        smooth_amplitude = smoothing.smooth_log(
+            self.amplitude[:self.number_of_measured], nth_octave, window_type)
+        amplitude_repr = 20*np.log10(np.maximum(smooth_amplitude,
+                                                np.finfo(float).tiny))
+        reference = np.argmin(np.abs(angles))
+        return (angles, amplitude_repr - amplitude_repr[reference],
+                angles[reference])
@@ -1,7 +1,6 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """ Main file of Kuray. Execute it to use the application. """
-import math
 import matplotlib as mpl
 mpl.rcParams['backend.qt4'] = 'PySide'
 from matplotlib.backends.backend_qt4agg import FigureCanvasQTAgg as FigureCanvas
@@ -9,15 +8,31 @@ import numpy as np
 import pyaudio
 import PySide.QtGui as QtGui
 import PySide.QtCore as QtCore
+import directivity
 import smoothing
 import signals
 import sys
+import waterfall
 
 CHUNK = 1024
 FORMAT = pyaudio.paInt16
 CHANNELS = 1
 RATE = 44100
 
+def measure_transfer_function(stream, signal):
+    """ Play `signal` on `stream`, record the answer and return the
+    transfer function between them. """
+    sweep = signal.generate_sweep()
+
+    stream.write(sweep)
+    chunks = []
+    for _ in range(signal.length_in_samples // CHUNK):
+        data = stream.read(CHUNK)
+        chunks.append(np.frombuffer(data, np.int16))
+    answer = np.concatenate(chunks)
+
+    return np.fft.fft(answer) * signal.inverse_filter()
+
 class Gui(QtGui.QMainWindow):
     """ Gui class for the main window. """
 
@@ -26,9 +41,19 @@ class Gui(QtGui.QMainWindow):
         self.setWindowTitle("Kuray")
 
         self.freq_response_frame = FrequencyResponseFrame()
+        self.directivity_frame = DirectivityFrame(
+            self.freq_response_frame.signal)
+        self.waterfall_frame = WaterfallFrame()
+        self.freq_response_frame.measured.connect(
+            self.waterfall_frame.set_impulse_response)
+
+        tabs = QtGui.QTabWidget(self)
+        tabs.addTab(self.freq_response_frame, "Frequency Response")
+        tabs.addTab(self.directivity_frame, "Directivity")
+        tabs.addTab(self.waterfall_frame, "Spectral Decay")
 
         self.create_menu()
-        self.setCentralWidget(self.freq_response_frame)
+        self.setCentralWidget(tabs)
 
     def create_menu(self):
         """ Create main menu """
@@ -68,9 +93,13 @@ class Gui(QtGui.QMainWindow):
 
 class FrequencyResponseFrame(QtGui.QWidget):
     """ Measure frequency responses """
+    # Emitted with the impulse response after every measurement
+    measured = QtCore.Signal(object)
+
     def __init__(self):
         QtGui.QWidget.__init__(self)
         self.amplitude = []
+        self.impulse_response = []
         self.phase = []
         self.amplitude_repr = []
         self.phase_repr = []
@@ -211,26 +240,12 @@ class FrequencyResponseFrame(QtGui.QWidget):
                                  input=True, output=True,
                                  frames_per_buffer=CHUNK)
 
-        sweep = self.signal.generate_sweep()
-
-        stream.write(sweep)
-        answer = []
-        for _ in range(self.signal.length_in_samples // CHUNK):
-            data = stream.read(CHUNK)
-            answer = np.append(answer, np.fromstring(data, 'Int16'))
-
-        fft_input = np.fft.fft(sweep)
-        fft_output = np.fft.fft(answer)
-        transfer_function = fft_output / fft_input
+        transfer_function = measure_transfer_function(stream, self.signal)
         self.amplitude = np.abs(transfer_function)
         self.phase = np.angle(transfer_function, deg=True)
+        self.impulse_response = np.real(np.fft.ifft(transfer_function))
 
-        f_min = self.signal.f_min
-        f_max = self.signal.f_max
-        number_of_points = 4048
-        frequency_ratio = math.log(f_max / f_min) / number_of_points
-        self.frequencies = [math.exp(i*frequency_ratio) * f_min
-                            for i in range(number_of_points)]
+        self.frequencies = smoothing.frequencies()
         self.update_data_representation()
 
         self.amplitude_line, = self.amplitude_axes.semilogx(self.frequencies,
@@ -239,6 +254,7 @@ class FrequencyResponseFrame(QtGui.QWidget):
                                                     self.phase_repr)
         self.set_plot_options()
         self.canvas.draw()
+        self.measured.emit(self.impulse_response)
 
     def set_plot_options(self):
         """ Set ticks, ticklabels, labels & titles of plots """
@@ -269,6 +285,293 @@ class FrequencyResponseFrame(QtGui.QWidget):
         self.amplitude_axes.set_ylabel("Amplitude [dB]")
         self.phase_axes.set_ylabel(u"Phase in °")
 
+class ManualTurntable(directivity.Turntable):
+    """ Turntable which asks the user to rotate the speaker by hand """
+
+    def __init__(self, parent):
+        directivity.Turntable.__init__(self)
+        self.parent = parent
+
+    def rotate_to(self, angle):
+        """ Ask the user to rotate to `angle` degrees """
+        reply = QtGui.QMessageBox.question(
+            self.parent, "Rotate speaker",
+            u"Rotate the speaker to %g° and press OK." % angle,
+            QtGui.QMessageBox.Ok | QtGui.QMessageBox.Cancel)
+        if reply != QtGui.QMessageBox.Ok:
+            return False
+        return directivity.Turntable.rotate_to(self, angle)
+
+class DirectivityFrame(QtGui.QWidget):
+    """ Measure responses over a range of angles """
+    def __init__(self, signal):
+        QtGui.QWidget.__init__(self)
+        self.signal = signal
+        self.turntable = ManualTurntable(self)
+        self.polar_response = None
+        self.reference_angle = None
+        self.smoothing_octave = 6
+        self.angle_start = -90.0
+        self.angle_stop = 90.0
+        self.angle_step = 10.0
+
+        angle_group = QtGui.QGroupBox("Angles")
+        angle_start_box = QtGui.QDoubleSpinBox(self)
+        angle_start_box.setSuffix(u" °")
+        angle_start_box.setRange(-180.0, 180.0)
+        angle_start_box.setValue(self.angle_start)
+        angle_start_box.valueChanged.connect(self.change_angle_start)
+        angle_stop_box = QtGui.QDoubleSpinBox(self)
+        angle_stop_box.setSuffix(u" °")
+        angle_stop_box.setRange(-180.0, 180.0)
+        angle_stop_box.setValue(self.angle_stop)
+        angle_stop_box.valueChanged.connect(self.change_angle_stop)
+        angle_step_box = QtGui.QDoubleSpinBox(self)
+        angle_step_box.setSuffix(u" °")
+        angle_step_box.setRange(1.0, 90.0)
+        angle_step_box.setValue(self.angle_step)
+        angle_step_box.valueChanged.connect(self.change_angle_step)
+        octave_combo = QtGui.QComboBox(self)
+        octave_combo.addItems(["3", "6", "10", "20"])
+        octave_combo.setCurrentIndex(1)
+        octave_combo.activated[str].connect(self.change_smoothing)
+        angle_form = QtGui.QFormLayout()
+        angle_form.addRow("First angle", angle_start_box)
+        angle_form.addRow("Last angle", angle_stop_box)
+        angle_form.addRow("Step", angle_step_box)
+        angle_form.addRow("Smoothing, in 1/nth octave", octave_combo)
+        angle_group.setLayout(angle_form)
+
+        self.fig = mpl.figure.Figure((5.0, 4.0))
+        bg_color = self.palette().color(QtGui.QPalette.Window).getRgbF()
+        self.fig.set_facecolor(bg_color)
+        self.canvas = FigureCanvas(self.fig)
+        self.axes = self.fig.add_axes([0.12, 0.12, 0.7, 0.8])
+        self.colorbar_axes = self.fig.add_axes([0.86, 0.12, 0.03, 0.8])
+
+        measure_button = QtGui.QPushButton("&Measure")
+        measure_button.clicked.connect(self.on_measure)
+
+        vbox = QtGui.QVBoxLayout()
+        vbox.addWidget(angle_group)
+        vbox.addWidget(self.canvas, stretch=1)
+        vbox.addWidget(measure_button)
+        self.setLayout(vbox)
+
+        self.set_plot_options()
+        self.canvas.draw()
+
+    def change_angle_start(self, angle):
+        """ Change first angle of the measurement """
+        self.angle_start = angle
+
+    def change_angle_stop(self, angle):
+        """ Change last angle of the measurement """
+        self.angle_stop = angle
+
+    def change_angle_step(self, angle):
+        """ Change angle between two measurements """
+        self.angle_step = angle
+
+    def change_smoothing(self, octave_str):
+        """ Change smoothing of the contour plot """
+        self.smoothing_octave = int(octave_str)
+        self.update_plot()
+
+    def on_measure(self):
+        """ Measure one response per angle, reusing the same sweep. """
+        angles = directivity.polar_angles(self.angle_start, self.angle_stop,
+                                          self.angle_step)
+        polar_response = directivity.PolarResponse(angles)
+
+        port_audio = pyaudio.PyAudio()
+        stream = port_audio.open(format=FORMAT, channels=CHANNELS, rate=RATE,
+                                 input=True, output=True,
+                                 frames_per_buffer=CHUNK, start=False)
+        try:
+            for angle in angles:
+                if not self.turntable.rotate_to(angle):
+                    break
+                # Only record while measuring, not while the turntable moves
+                stream.start_stream()
+                transfer_function = measure_transfer_function(stream,
+                                                              self.signal)
+                stream.stop_stream()
+                one_sided = transfer_function[:len(transfer_function)//2 + 1]
+                polar_response.add(np.abs(one_sided), RATE / 2.)
+        finally:
+            stream.close()
+            port_audio.terminate()
+
+        # A contour plot needs at least two angles; keep the previous
+        # measurement on screen if the run was cancelled before that
+        if polar_response.number_of_measured < 2:
+            return
+        self.polar_response = polar_response
+        self.update_plot()
+
+    def update_plot(self):
+        """ Draw the smoothed responses as a contour plot """
+        if (self.polar_response is None
+                or self.polar_response.number_of_measured < 2):
+            return
+
+        angles, amplitude_repr, self.reference_angle = \
+            self.polar_response.representation(self.smoothing_octave)
+        frequencies = smoothing.frequencies()
+
+        self.axes.clear()
+        self.colorbar_axes.clear()
+        contour = self.axes.contourf(frequencies, angles, amplitude_repr,
+                                     levels=np.arange(-30, 9, 3),
+                                     extend='both')
+        self.fig.colorbar(contour, cax=self.colorbar_axes)
+        self.set_plot_options()
+        self.canvas.draw()
+
+    def set_plot_options(self):
+        """ Set ticks, ticklabels, labels & titles of the plot """
+        tick_frequencies = [31, 62, 125, 250, 500, 1000,
+                            2000, 4000, 8000, 16000]
+        ticklabel_frequencies = ["31", "62", "125", "250", "500", "1k",
+                                 "2k", "4k", "8k", "16k"]
+        self.axes.set_xscale('log')
+        self.axes.set_xlim(30, 2e4)
+        self.axes.set_xticks(tick_frequencies)
+        self.axes.set_xticklabels(ticklabel_frequencies)
+        self.axes.yaxis.set_major_locator(mpl.ticker.MultipleLocator(30))
+
+        self.axes.set_title("Directivity")
+        self.axes.set_xlabel("Frequency [Hz]")
+        self.axes.set_ylabel(u"Angle in °")
+        if self.reference_angle is None:
+            self.colorbar_axes.set_ylabel("Amplitude [dB]")
+        else:
+            self.colorbar_axes.set_ylabel(u"Amplitude re. %g° [dB]"
+                                          % self.reference_angle)
+
+class WaterfallFrame(QtGui.QWidget):
+    """ Show the cumulative spectral decay of the last measurement """
+    def __init__(self):
+        QtGui.QWidget.__init__(self)
+        self.impulse_response = []
+        self.smoothing_octave = 6
+        self.number_of_slices = 200
+        self.slice_step = 0.5
+
+        decay_group = QtGui.QGroupBox("Representation")
+        slices_box = QtGui.QSpinBox(self)
+        slices_box.setRange(10, 1000)
+        slices_box.setValue(self.number_of_slices)
+        # Recompute only once editing is done, not for every typed digit
+        slices_box.setKeyboardTracking(False)
+        slices_box.valueChanged.connect(self.change_number_of_slices)
+        step_box = QtGui.QDoubleSpinBox(self)
+        step_box.setSuffix(" ms")
+        step_box.setSingleStep(0.1)
+        step_box.setRange(0.1, 10.0)
+        step_box.setValue(self.slice_step)
+        step_box.setKeyboardTracking(False)
+        step_box.valueChanged.connect(self.change_slice_step)
+        octave_combo = QtGui.QComboBox(self)
+        octave_combo.addItems(["3", "6", "10", "20"])
+        octave_combo.setCurrentIndex(1)
+        octave_combo.activated[str].connect(self.change_smoothing)
+        decay_form = QtGui.QFormLayout()
+        decay_form.addRow("Number of slices", slices_box)
+        decay_form.addRow("Time between slices", step_box)
+        decay_form.addRow("Smoothing, in 1/nth octave", octave_combo)
+        decay_group.setLayout(decay_form)
+
+        self.fig = mpl.figure.Figure((5.0, 4.0))
+        bg_color = self.palette().color(QtGui.QPalette.Window).getRgbF()
+        self.fig.set_facecolor(bg_color)
+        self.canvas = FigureCanvas(self.fig)
+        self.axes = self.fig.add_axes([0.12, 0.12, 0.7, 0.8])
+        self.colorbar_axes = self.fig.add_axes([0.86, 0.12, 0.03, 0.8])
+
+        vbox = QtGui.QVBoxLayout()
+        vbox.addWidget(decay_group)
+        vbox.addWidget(self.canvas, stretch=1)
+        self.setLayout(vbox)
+
+        self.set_plot_options()
+        self.canvas.draw()
+
+    def set_impulse_response(self, impulse_response):
+        """ Show the decay of a new measurement """
+        self.impulse_response = impulse_response
+        self.update_plot()
+
+    def change_number_of_slices(self, number_of_slices):
+        """ Change the number of time slices """
+        self.number_of_slices = number_of_slices
+        self.update_plot()
+
+    def change_slice_step(self, slice_step):
+        """ Change the time between two slices (ms) """
+        self.slice_step = slice_step
+        self.update_plot()
+
+    def change_smoothing(self, octave_str):
+        """ Change smoothing of every slice """
+        self.smoothing_octave = int(octave_str)
+        self.update_plot()
+
+    def update_plot(self):
+        """ Draw all slices as one image over frequency and time """
+        if len(self.impulse_response) == 0:
+            return
+
+        slice_step = max(1, int(round(self.slice_step * 1e-3 * RATE)))
+        self.axes.clear()
+        self.colorbar_axes.clear()
+        try:
+            times, decay = waterfall.cumulative_spectral_decay(
+                self.impulse_response, self.number_of_slices, slice_step,
+                nth_octave=self.smoothing_octave)
+        except waterfall.ImpulseResponseTooShortError:
+            self.set_plot_options()
+            self.axes.text(0.5, 0.5, "Impulse response peak is too close\n"
+                           "to its end to compute a decay",
+                           transform=self.axes.transAxes,
+                           horizontalalignment='center',
+                           verticalalignment='center')
+            self.canvas.draw()
+            return
+
+        # The slices are evenly spaced in time and in log frequency, so they
+        # can be drawn as a single image on a log10(frequency) axis
+        frequency_edges = np.log10(smoothing.frequency_edges())
+        # Every slice lasts until the next one starts
+        time_end = len(times) * slice_step * 1e3 / RATE
+        image = self.axes.imshow(decay, aspect='auto', origin='lower',
+                                 interpolation='nearest', vmin=-40, vmax=0,
+                                 extent=[frequency_edges[0],
+                                         frequency_edges[-1], 0, time_end])
+        self.fig.colorbar(image, cax=self.colorbar_axes)
+        self.set_plot_options()
+        if len(times) < self.number_of_slices:
+            self.axes.set_title("Cumulative Spectral Decay "
+                                "(only %d slices fit)" % len(times))
+        self.canvas.draw()
+
+    def set_plot_options(self):
+        """ Set ticks, ticklabels, labels & titles of the plot """
+        tick_frequencies = [31, 62, 125, 250, 500, 1000,
+                            2000, 4000, 8000, 16000]
+        ticklabel_frequencies = ["31", "62", "125", "250", "500", "1k",
+                                 "2k", "4k", "8k", "16k"]
+        # The x-axis is log10(frequency), see `update_plot`
+        self.axes.set_xlim(np.log10(30), np.log10(2e4))
+        self.axes.set_xticks(np.log10(tick_frequencies))
+        self.axes.set_xticklabels(ticklabel_frequencies)
+
+        self.axes.set_title("Cumulative Spectral Decay")
+        self.axes.set_xlabel("Frequency [Hz]")
+        self.axes.set_ylabel("Time [ms]")
+        self.colorbar_axes.set_ylabel("Amplitude [dB]")
+
 def main():
     """ Main function; acts as entry point for Kuray. """
     app = QtGui.QApplication(sys.argv)
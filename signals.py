@@ -12,7 +12,9 @@ class Sweep(object):
         self._f_max = f_max
         self._length_in_samples = CHUNK * int(round(length * RATE // CHUNK))
         self._length = self.length_in_samples // RATE
-        
+        self._sweep = None
+        self._inverse_filter = None
+
     @property
     def f_min(self):
         """ Lowest frequency """
@@ -22,6 +24,7 @@ class Sweep(object):
     def f_min(self, f_min):
         """ Set minimum frequency """
         self._f_min = f_min
+        self._clear_cache()
 
     @property
     def f_max(self):
@@ -32,6 +35,7 @@ class Sweep(object):
     def f_max(self, f_max):
         """ Set maximum frequency """
         self._f_max = f_max
+        self._clear_cache()
 
     @property
     def length(self):
@@ -43,6 +47,7 @@ class Sweep(object):
         """ Set signal length (seconds) """
         self._length_in_samples = CHUNK * int(round(length * RATE // CHUNK))
         self._length = self._length_in_samples // RATE
+        self._clear_cache()
 
     @property
     def length_in_samples(self):
@@ -54,9 +59,19 @@ class Sweep(object):
         """ Set signal length (samples) """
         self._length_in_samples = CHUNK * int(round(length_in_samples // CHUNK))
         self._length = self._length_in_samples // RATE
+        self._clear_cache()
+
+    def _clear_cache(self):
+        """ Forget generated sweep after a parameter changed """
+        self._sweep = None
+        self._inverse_filter = None
 
     def generate_sweep(self):
-        """ Generate sweep with `length` number of samples. """
+        """ Generate sweep with `length` number of samples. The sweep is
+        cached until one of its parameters changes. """
+        if self._sweep is not None:
+            return self._sweep
+
         amp = 2**15 - 1
         phi = 0.0
         d_phi = 2*np.pi*self.f_min/RATE
@@ -68,5 +83,12 @@ class Sweep(object):
             d_phi *= 2**(np.log2(self.f_max - self.f_min) 
                     / self.length_in_samples)
 
-        sweep = np.int16(sweep)
-        return sweep
+        self._sweep = np.int16(sweep)
+        return self._sweep
+
+    def inverse_filter(self):
+        """ Spectrum which deconvolves a recorded answer to this sweep into
+        a transfer function, i.e. 1 / FFT(sweep). """
+        if self._inverse_filter is None:
+            self._inverse_filter = 1.0 / np.fft.fft(self.generate_sweep())
+        return self._inverse_filter
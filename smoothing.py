@@ -1,38 +1,99 @@
 """ Smooth frequency response """
 
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
 import math
 
-def _distribute_over_log(input_data, f_min, f_max, number_of_points):
-    """ Distribute linear input data over logarithmic frequency scaling """
+F_MIN = 30
+F_MAX = 20e3
+# ideally, this should be computed from the display resolution
+NUMBER_OF_POINTS = 4048
 
+def _log_frequencies(f_min, f_max, number_of_points, positions=None):
+    """ Frequencies of a grid with `number_of_points` logarithmically spaced
+    points from `f_min` towards `f_max`, at the (fractional) point indices
+    `positions`; all points by default """
+    if positions is None:
+        positions = np.arange(number_of_points)
     frequency_ratio = math.log(f_max / f_min) / number_of_points
-    frequencies = [math.exp(i*frequency_ratio) * f_min
-                        for i in range(number_of_points)]
+    return np.exp(positions * frequency_ratio) * f_min
 
-    log_data = []
-    for freq in frequencies:
-        index = round((freq - f_min) / (f_max - f_min) * len(input_data))
-        log_data.append(input_data[index])
+def frequencies():
+    """ Frequencies of the points returned by `smooth` """
+    return _log_frequencies(F_MIN, F_MAX, NUMBER_OF_POINTS)
 
-    return log_data
+def frequency_edges():
+    """ Edges of the cells around each of `frequencies`, for images """
+    return _log_frequencies(F_MIN, F_MAX, NUMBER_OF_POINTS,
+                            np.arange(NUMBER_OF_POINTS + 1) - 0.5)
 
-def smooth(input_data, nth_octave = 6, window_type='hamming'):
-    """ Smooth input data over 1/n octave """
+def _distribute_over_log(input_data, f_min, f_max, number_of_points,
+                         frequency_max=None):
+    """ Distribute linear input data over logarithmic frequency scaling.
 
-    f_min = 30
-    f_max = 20e3
+    `input_data` may hold several curves stacked along its first axis; the
+    redistribution is always done along the last axis. If `frequency_max` is
+    given, the input bins run linearly from 0 Hz up to `frequency_max` (e.g.
+    the output of ``np.fft.rfft``) and are interpolated linearly. """
 
-    number_of_octaves = math.log(f_max / f_min, 2)
+    input_data = np.asarray(input_data)
+    log_frequencies = _log_frequencies(f_min, f_max, number_of_points)
 
-    # ideally, this should be computed from the display resolution
-    number_of_points = 4048
-    points_per_octave = number_of_points / number_of_octaves
+    if frequency_max is None:
+        indices = np.round((log_frequencies - f_min) / (f_max - f_min)
+                           * input_data.shape[-1]).astype(int)
+        return input_data.take(indices, axis=-1)
 
-    log_data = _distribute_over_log(input_data, f_min, f_max, 
-                                                 number_of_points)
+    positions = log_frequencies / frequency_max * (input_data.shape[-1] - 1)
+    lower = np.floor(positions).astype(int)
+    upper = np.minimum(lower + 1, input_data.shape[-1] - 1)
+    weight = positions - lower
+    return (input_data.take(lower, axis=-1) * (1 - weight)
+            + input_data.take(upper, axis=-1) * weight)
 
-    window_length = points_per_octave / nth_octave
+def distribute_over_log(input_data, frequency_max):
+    """ Distribute a one-sided spectrum, whose bins run linearly from 0 Hz to
+    `frequency_max`, over the logarithmic frequencies `smooth` works on. """
+    return _distribute_over_log(input_data, F_MIN, F_MAX, NUMBER_OF_POINTS,
+                                frequency_max)
+
+def _sliding_convolve(window, data):
+    """ Convolve every row of `data` with `window`, like
+    ``np.convolve(window, row, mode='same')`` but without a loop over rows. """
+
+    window_length = len(window)
+    pad_width = [(0, 0)] * (data.ndim - 1)
+    pad_width.append((window_length // 2, (window_length - 1) // 2))
+    padded = np.ascontiguousarray(np.pad(data, pad_width, mode='constant'))
+
+    # View every window position as an extra axis, without copying
+    shape = data.shape + (window_length,)
+    strides = padded.strides + (padded.strides[-1],)
+    windows = as_strided(padded, shape=shape, strides=strides)
+
+    return windows.dot(window[::-1])
+
+def smooth(input_data, nth_octave = 6, window_type='hamming',
+           frequency_max=None):
+    """ Smooth input data over 1/n octave.
+
+    `input_data` is either a single curve or a 2D array with one curve per
+    row, in which case all rows are smoothed at once. See
+    `_distribute_over_log` for the meaning of `frequency_max`. """
+
+    log_data = _distribute_over_log(input_data, F_MIN, F_MAX,
+                                    NUMBER_OF_POINTS, frequency_max)
+    return smooth_log(log_data, nth_octave, window_type)
+
+def smooth_log(log_data, nth_octave = 6, window_type='hamming'):
+    """ Smooth data which is already distributed over logarithmic
+    frequencies (see `distribute_over_log`) over 1/n octave. """
+
+    number_of_octaves = math.log(F_MAX / F_MIN, 2)
+    points_per_octave = NUMBER_OF_POINTS / number_of_octaves
+
+    # Window functions need a whole number of points
+    window_length = int(round(points_per_octave / nth_octave))
 
     if window_type == 'hamming':
         window = np.hamming(window_length)
@@ -43,5 +104,5 @@ def smooth(input_data, nth_octave = 6, window_type='hamming'):
     elif window_type == 'hanning':
         window = np.hanning(window_length)
 
-    output = np.convolve(window / window.sum(), log_data, mode='same')
+    output = _sliding_convolve(window / window.sum(), log_data)
     return output
@@ -0,0 +1,62 @@
+""" Cumulative spectral decay (waterfall) of an impulse response """
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+import signals
+import smoothing
+
+class ImpulseResponseTooShortError(ValueError):
+    """ Raised if not even one slice fits behind the impulse response peak """
+
+def _slices(data, number_of_slices, slice_step, slice_length):
+    """ View `data` as overlapping slices, without copying """
+    itemsize = data.itemsize
+    return as_strided(data, shape=(number_of_slices, slice_length),
+                      strides=(slice_step * itemsize, itemsize))
+
+def cumulative_spectral_decay(impulse_response, number_of_slices=200,
+                              slice_step=22, window_length=1024,
+                              nth_octave=6, window_type='hamming'):
+    """ Compute the cumulative spectral decay of `impulse_response`.
+
+    Slices start at the peak of the impulse response and are `slice_step`
+    samples apart. Fewer than `number_of_slices` are returned if they do not
+    all fit behind the peak; check the length of the returned times. All of
+    them end at the same point, `window_length` samples after the start of
+    the last slice, where they are faded out with a half Hann window. Each
+    slice is smoothed over 1/`nth_octave` octave, like the frequency
+    response. Returns the start time of every slice in seconds and a
+    (slice x frequency) array in dB relative to the first slice. """
+
+    impulse_response = np.ascontiguousarray(impulse_response, dtype=float)
+    start = np.argmax(np.abs(impulse_response))
+    impulse_response = impulse_response[start:]
+
+    available = len(impulse_response) - window_length
+    if available < 0:
+        raise ImpulseResponseTooShortError(
+            "The impulse response ends less than %d samples after its peak"
+            % window_length)
+    # The strided view of the last slice reaches past the common end point
+    number_of_slices = min(number_of_slices, available // (2 * slice_step) + 1)
+    slice_length = window_length + (number_of_slices - 1) * slice_step
+
+    # One window with unit gain, faded out only at the common end. The zeros
+    # behind it cut every slice off at that end in the strided view below.
+    fade_length = window_length // 2
+    window = np.zeros(slice_length + (number_of_slices - 1) * slice_step)
+    window[:slice_length] = 1.0
+    window[slice_length - fade_length:slice_length] = \
+        np.hanning(2 * fade_length)[fade_length:]
+
+    slices = _slices(impulse_response, number_of_slices, slice_step,
+                     slice_length)
+    windows = _slices(window, number_of_slices, slice_step, slice_length)
+    spectra = np.abs(np.fft.rfft(slices * windows, axis=-1))
+
+    smooth_spectra = smoothing.smooth(spectra, nth_octave, window_type,
+                                      frequency_max=signals.RATE / 2.)
+    decay = 20*np.log10(np.maximum(smooth_spectra, np.finfo(float).tiny))
+    decay = decay - decay[0].max()
+
+    times = np.arange(number_of_slices) * slice_step / float(signals.RATE)
+    return times, decay